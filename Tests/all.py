@@ -4,6 +4,9 @@ import unittest, argparse
 import test_python_version
 import test_examples
 import test_structreading
+import test_config
+import test_outcarreading
+import test_ioadapters
 import test_httk_src_inline
 
 logdata = []
@@ -21,6 +24,12 @@ try:
 
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_structreading.TestStructreading))
 
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_config.TestConfig))
+
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_outcarreading.TestOutcarReading))
+
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_ioadapters.TestIoAdapters))
+
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_httk_src_inline.TestHttkSrcInline))
     
     unittest.TextTestRunner(verbosity=2).run(suite)
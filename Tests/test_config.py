@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+import sys, os, unittest, argparse, shutil, tempfile, importlib, json
+
+if sys.version_info[0] == 3:
+    import configparser
+else:
+    import ConfigParser as configparser
+
+import httk
+httkconfig = importlib.import_module('httk.config.config')
+
+top = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+cfg_files = [os.path.join(top, 'src', 'httk', 'httk.cfg'), os.path.join(top, 'httk.cfg.example'), os.path.join(top, 'httk.cfg.empty')]
+
+sha1 = '1111111111111111111111111111111111111111'
+sha2 = '2222222222222222222222222222222222222222'
+
+class TestConfig(unittest.TestCase):
+
+    saved_globals = ('httk_root', '_git_dir', '_distdata', '_bypass_git_version_lookup', '_cache_git_version')
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='httk_test_config.')
+        self.saved = dict((name, getattr(httkconfig, name)) for name in self.saved_globals)
+        self.saved_version_cache = dict(httkconfig._version_cache)
+        self.saved_xdg = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(httkconfig, name, value)
+        httkconfig._version_cache.clear()
+        httkconfig._version_cache.update(self.saved_version_cache)
+        if self.saved_xdg is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.saved_xdg
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, relpath, content):
+        path = os.path.join(self.tmpdir, relpath)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def make_git_dir(self, head, refs={}, packed_refs=None, name='repo/.git'):
+        git_dir = os.path.join(self.tmpdir, name)
+        self.write(os.path.join(name, 'HEAD'), head + '\n')
+        for ref, sha in refs.items():
+            self.write(os.path.join(name, ref), sha + '\n')
+        if packed_refs is not None:
+            self.write(os.path.join(name, 'packed-refs'), packed_refs)
+        return git_dir
+
+    def assert_same_config(self, filenames):
+        fast = httkconfig._FastConfig()
+        reference = configparser.RawConfigParser()
+        self.assertEqual(fast.read(filenames), reference.read(filenames))
+        self.assertEqual(sorted(fast.sections()), sorted(reference.sections()))
+        for section in fast.sections() + ['DEFAULT']:
+            self.assertEqual(sorted(fast.items(section)), sorted(reference.items(section)))
+            for option, value in reference.items(section):
+                self.assertEqual(fast.get(section, option), reference.get(section, option))
+                self.assertEqual(fast.get(section, option.upper()), reference.get(section, option.upper()))
+                self.assertTrue(fast.has_option(section, option))
+            self.assertFalse(fast.has_option(section, 'no_such_option'))
+
+    def test_fastconfig_shipped_files(self):
+        for filename in cfg_files:
+            self.assert_same_config([filename])
+        self.assert_same_config(cfg_files)
+
+    def test_fastconfig_syntax(self):
+        filename = self.write('test.cfg', "## Comment\n; Other comment\n[DEFAULT]\nshared = 1\ncolor = blue\n\n"
+                                          "[general]\nOption_A=yes\noption_b : spaced value \ncolor=red\nempty=\n"
+                                          "[paths]\nlate = 2\n")
+        override = self.write('override.cfg', "[general]\noption_a=no\n[extra]\nx=y\n")
+        self.assert_same_config([filename])
+        self.assert_same_config([filename, os.path.join(self.tmpdir, 'missing.cfg'), override])
+
+        fast = httkconfig._FastConfig()
+        fast.read([filename])
+        self.assertFalse(fast.has_section('DEFAULT'))
+        self.assertEqual(fast.get('paths', 'color'), 'blue')
+        self.assertTrue(fast.getboolean('general', 'option_a'))
+        self.assertRaises(ValueError, fast.getboolean, 'general', 'color')
+        self.assertRaises(configparser.NoSectionError, fast.get, 'nosection', 'option_a')
+        self.assertRaises(configparser.NoSectionError, fast.items, 'nosection')
+        self.assertRaises(configparser.NoOptionError, fast.get, 'general', 'nooption')
+        self.assertEqual(fast.get('nosection', 'option_a', fallback=None), None)
+        self.assertEqual(fast.getboolean('general', 'nooption', fallback=False), False)
+
+    def test_find_git_dir(self):
+        git_dir = self.make_git_dir('ref: refs/heads/master')
+        self.assertEqual(httkconfig._find_git_dir(os.path.join(self.tmpdir, 'repo')), git_dir)
+        self.write('worktree/.git', 'gitdir: ../repo/.git/worktrees/wt\n')
+        self.assertEqual(os.path.normpath(httkconfig._find_git_dir(os.path.join(self.tmpdir, 'worktree'))),
+                         os.path.join(git_dir, 'worktrees', 'wt'))
+        self.write('notgit/.git', 'something else\n')
+        self.assertEqual(httkconfig._find_git_dir(os.path.join(self.tmpdir, 'notgit')), None)
+        self.assertEqual(httkconfig._find_git_dir(os.path.join(self.tmpdir, 'nothing')), None)
+
+    def test_read_head_sha(self):
+        git_dir = self.make_git_dir('ref: refs/heads/master', refs={'refs/heads/master': sha1})
+        self.assertEqual(httkconfig._read_head_sha(git_dir), sha1)
+
+        packed = "# pack-refs with: peeled fully-peeled sorted \n" + sha2 + " refs/heads/master\n^" + sha1 + "\n"
+        git_dir = self.make_git_dir('ref: refs/heads/master', packed_refs=packed, name='packed/.git')
+        self.assertEqual(httkconfig._read_head_sha(git_dir), sha2)
+
+        git_dir = self.make_git_dir(sha1, name='detached/.git')
+        self.assertEqual(httkconfig._read_head_sha(git_dir), sha1)
+
+        common_dir = self.make_git_dir('ref: refs/heads/master', refs={'refs/heads/branch': sha2}, name='main/.git')
+        git_dir = self.make_git_dir('ref: refs/heads/branch', name='main/.git/worktrees/wt')
+        self.write('main/.git/worktrees/wt/commondir', '../..\n')
+        self.assertEqual(httkconfig._read_head_sha(git_dir), sha2)
+        self.assertEqual(os.path.normpath(httkconfig._common_git_dir(git_dir)), common_dir)
+
+        # Readable HEAD that cannot be resolved from the files, e.g., no commits yet or reftable
+        git_dir = self.make_git_dir('ref: refs/heads/.invalid', name='unresolved/.git')
+        self.assertEqual(httkconfig._read_head_sha(git_dir), None)
+
+        self.assertRaises(IOError, httkconfig._read_head_sha, os.path.join(self.tmpdir, 'nothing', '.git'))
+
+    def test_git_state_key(self):
+        httkconfig._git_dir = self.make_git_dir('ref: refs/heads/master', refs={'refs/heads/master': sha1},
+                                                packed_refs=sha1 + " refs/tags/v1.0\n")
+        tags_dir = os.path.join(httkconfig._git_dir, 'refs', 'tags')
+        os.makedirs(tags_dir)
+        os.utime(tags_dir, (1000000000, 1000000000))
+        key = httkconfig._git_state_key(sha1)
+        self.assertEqual(key[0], sha1)
+        self.assertEqual(httkconfig._git_state_key(sha1), key)
+        self.assertNotEqual(httkconfig._git_state_key(sha2), key)
+        self.assertEqual(httkconfig._git_state_key(None), key[1:])
+
+        self.write('repo/.git/refs/tags/v2.0', sha1 + '\n')
+        tag_key = httkconfig._git_state_key(sha1)
+        self.assertNotEqual(tag_key, key)
+
+        self.write('repo/.git/packed-refs', sha1 + " refs/tags/v1.0\n" + sha1 + " refs/tags/v1.1\n")
+        self.assertNotEqual(httkconfig._git_state_key(sha1), tag_key)
+
+        self.write('repo/.git/index', 'staged')
+        self.assertNotEqual(httkconfig._git_state_key(sha1), tag_key)
+
+    def test_version_cache(self):
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'repo')
+        version_data = {'httk_version': '1.2.3', 'httk_version_date': '2020-01-02', 'httk_copyright_note': 'note'}
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.0, 2]), None)
+        httkconfig._write_version_cache([sha1, 1.0, 2], version_data)
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.0, 2]), version_data)
+        self.assertEqual(httkconfig._read_version_cache([sha2, 1.0, 2]), None)
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.5, 2]), None)
+
+        # Entries for other roots are kept
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'other')
+        httkconfig._write_version_cache([sha2], version_data)
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'repo')
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.0, 2]), version_data)
+        with open(httkconfig._version_cache_path()) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+        self.write(httkconfig._version_cache_path(), '{not json')
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.0, 2]), None)
+        httkconfig._write_version_cache([sha1, 1.0, 2], version_data)
+        self.assertEqual(httkconfig._read_version_cache([sha1, 1.0, 2]), version_data)
+
+    def test_determine_version_data_cache(self):
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'repo')
+        httkconfig._git_dir = self.make_git_dir('ref: refs/heads/master', refs={'refs/heads/master': sha1})
+        httkconfig._distdata = None
+        httkconfig._bypass_git_version_lookup = False
+        cached = {'httk_version': 'cached', 'httk_version_date': 'cached', 'httk_copyright_note': 'cached'}
+        httkconfig._write_version_cache(httkconfig._git_state_key(sha1), cached)
+
+        httkconfig._cache_git_version = True
+        self.assertEqual(httkconfig.determine_version_data(), cached)
+        self.assertNotEqual(httkconfig.determine_version_data(use_cache=False), cached)
+
+        httkconfig._version_cache.clear()
+        httkconfig._cache_git_version = False
+        self.assertNotEqual(httkconfig.determine_version_data(), cached)
+        httkconfig._version_cache.clear()
+        self.assertEqual(httkconfig.determine_version_data(use_cache=True), cached)
+
+    def test_determine_version_data_unresolved_head(self):
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'repo')
+        httkconfig._git_dir = self.make_git_dir('ref: refs/heads/.invalid')
+        httkconfig._distdata = None
+        httkconfig._bypass_git_version_lookup = False
+        httkconfig._cache_git_version = True
+        httkconfig.determine_version_data()
+        self.assertFalse(os.path.exists(httkconfig._version_cache_path()))
+
+    def test_determine_version_data_no_head(self):
+        httkconfig.httk_root = os.path.join(self.tmpdir, 'repo')
+        httkconfig._git_dir = os.path.join(self.tmpdir, 'repo', '.git')
+        httkconfig._distdata = None
+        httkconfig._bypass_git_version_lookup = False
+        version_data = httkconfig.determine_version_data(use_cache=False)
+        self.assertEqual(version_data['httk_version'], 'unknown')
+        self.assertEqual(version_data['httk_version_date'], 'unknown')
+
+    def test_package_attributes(self):
+        package = sys.modules['httk.config']
+        self.assertEqual(package.version, httkconfig.version)
+        self.assertEqual(package.httk_version_date, httkconfig.httk_version_date)
+        self.assertRaises(AttributeError, getattr, package, '_git_dir')
+        self.assertRaises(AttributeError, getattr, package, 'no_such_attribute')
+
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Configuration and version lookup tests")
+    args, leftovers = ap.parse_known_args()
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestConfig)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+import sys, os, unittest, argparse, shutil, tempfile
+
+import httk
+from httk.core import ioadapters
+from httk.core.ioadapters import cleveropen, IoAdapterFileReader
+
+content = "line one\nline two with unicode \u00e5\u00e4\u00f6\n" * 1000 if sys.version_info[0] == 3 else "line one\nline two\n" * 1000
+
+
+class TestIoAdapters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='httk_test_ioadapters.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @unittest.skipIf(ioadapters.zstandard is None, "the zstandard module is not installed")
+    def test_zst_roundtrip(self):
+        filename = os.path.join(self.tmpdir, 'data.zst')
+        f = cleveropen(filename, 'w')
+        f.write(content)
+        f.close()
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(4), b'\x28\xb5\x2f\xfd')
+        f = cleveropen(filename, 'r')
+        self.assertEqual(f.read(), content)
+        f.close()
+
+        # Reading through the io adapters, as done when loading files by name
+        ioa = IoAdapterFileReader.use(filename)
+        self.assertEqual(''.join(ioa), content)
+
+    @unittest.skipIf(ioadapters.zstandard is None, "the zstandard module is not installed")
+    def test_zst_binary_and_args(self):
+        filename = os.path.join(self.tmpdir, 'data.ZST')
+        data = content.encode('utf-8')
+        # Further arguments are passed on to zstandard.open, here the compressor
+        f = cleveropen(filename, 'wb', ioadapters.zstandard.ZstdCompressor(level=19))
+        f.write(data)
+        f.close()
+        f = cleveropen(filename, 'rb')
+        self.assertEqual(f.read(), data)
+        f.close()
+
+    def test_zst_without_zstandard(self):
+        saved = ioadapters.zstandard
+        ioadapters.zstandard = None
+        try:
+            self.assertRaises(IOError, cleveropen, os.path.join(self.tmpdir, 'data.zst'), 'r')
+        finally:
+            ioadapters.zstandard = saved
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Io adapter tests")
+    args, leftovers = ap.parse_known_args()
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestIoAdapters)
+    unittest.TextTestRunner(verbosity=2).run(suite)
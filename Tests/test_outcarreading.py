@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+import sys, os, unittest, argparse, shutil, tempfile
+
+if sys.version_info[0] == 3:
+    from io import StringIO
+else:
+    from StringIO import StringIO
+
+import httk
+from httk.core.ioadapters import IoAdapterFileReader
+from httk.iface import vasp_if
+
+
+def energy_line(with_entropy, sigma0):
+    return "  energy  without entropy=     " + with_entropy + "  energy(sigma->0) =     " + sigma0 + "\n"
+
+free_energie_line = "  FREE ENERGIE OF THE ION-ELECTRON SYSTEM (eV)\n"
+
+# On Python 2, files opened by OutcarReader are always scanned from the start
+tail_first = sys.version_info[0] >= 3
+
+
+class TestOutcarReading(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='httk_test_outcar.')
+        # Enough filler to push everything before it out of the part of the file that is searched first
+        self.filler = " filler line of an OUTCAR that matches nothing\n" * (3 * vasp_if._outcar_tail_bytes // 48 + 1)
+        self.scans = 0
+        self.orig_scan = vasp_if.OutcarReader._scan
+
+        def counting_scan(lines):
+            self.scans += 1
+            return self.orig_scan(lines)
+        vasp_if.OutcarReader._scan = staticmethod(counting_scan)
+
+    def tearDown(self):
+        vasp_if.OutcarReader._scan = staticmethod(self.orig_scan)
+        shutil.rmtree(self.tmpdir)
+
+    def write_outcar(self, content):
+        self.assertTrue(len(content) > vasp_if._outcar_tail_bytes)
+        path = os.path.join(self.tmpdir, 'OUTCAR')
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def assert_outcar(self, outcar, with_entropy, sigma0, final):
+        self.assertTrue(outcar.parsed)
+        self.assertEqual(float(outcar.final_energy_with_entropy), float(with_entropy))
+        self.assertEqual(float(outcar.final_energy), float(sigma0))
+        self.assertEqual(outcar.final, final)
+
+    def test_tail_has_energy_and_final(self):
+        content = (energy_line('-1.0', '-1.1') + free_energie_line + self.filler + energy_line('-2.0', '-2.1') +
+                   free_energie_line + energy_line('-3.0', '-3.1') + " end\n")
+        self.assert_outcar(vasp_if.read_outcar(self.write_outcar(content)), '-3.0', '-3.1', True)
+        # Only the tail was scanned
+        self.assertEqual(self.scans, 1)
+
+    def test_tail_missing_energy(self):
+        content = energy_line('-1.0', '-1.1') + free_energie_line + energy_line('-2.0', '-2.1') + self.filler + free_energie_line
+        self.assert_outcar(vasp_if.read_outcar(self.write_outcar(content)), '-2.0', '-2.1', True)
+        # The tail was scanned, then the whole file
+        self.assertEqual(self.scans, 2 if tail_first else 1)
+
+    def test_tail_missing_final(self):
+        content = free_energie_line + energy_line('-1.0', '-1.1') + self.filler + energy_line('-3.0', '-3.1')
+        self.assert_outcar(vasp_if.read_outcar(self.write_outcar(content)), '-3.0', '-3.1', True)
+        # The tail was scanned, then the whole file
+        self.assertEqual(self.scans, 2 if tail_first else 1)
+
+        content = energy_line('-1.0', '-1.1') + self.filler + energy_line('-3.0', '-3.1')
+        self.assert_outcar(vasp_if.read_outcar(self.write_outcar(content)), '-3.0', '-3.1', False)
+
+    def test_stringio(self):
+        content = (energy_line('-1.0', '-1.1') + free_energie_line + self.filler + energy_line('-2.0', '-2.1') +
+                   free_energie_line + energy_line('-3.0', '-3.1'))
+        self.assert_outcar(vasp_if.read_outcar(StringIO(content)), '-3.0', '-3.1', True)
+        self.assertEqual(self.scans, 1)
+
+    def test_caller_reader_left_open(self):
+        content = energy_line('-1.0', '-1.1') + self.filler + free_energie_line + energy_line('-3.0', '-3.1')
+        f = open(self.write_outcar(content), 'r')
+        try:
+            ioa = IoAdapterFileReader(f, name='OUTCAR', close=True)
+            self.assert_outcar(vasp_if.read_outcar(ioa), '-3.0', '-3.1', True)
+            self.assertFalse(f.closed)
+            self.assertTrue(ioa.file is f)
+        finally:
+            f.close()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="OUTCAR reading tests")
+    args, leftovers = ap.parse_known_args()
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestOutcarReading)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -14,6 +14,8 @@ from os import path
 here = path.abspath(path.dirname(__file__))
 sys.path.insert(1, os.path.join(here,'src/httk/config'))
 import config
+# The version written into distdata.py must reflect the working tree as it is now, so always ask git rather than a cache
+version_data = config.determine_version_data(use_cache=False)
 
 buildpath = path.join(here, 'BUILD')
 if os.path.exists(buildpath):
@@ -45,9 +47,9 @@ class HttkInstallCommand(install):
     def run(self):
         install.run(self)
         f = open(os.path.join(self.install_lib,'httk','distdata.py'),'w')
-        f.write('version = \"' + config.version + '\"\n')
-        f.write('version_date = \"' + config.version_date + '\"\n')
-        f.write('copyright_note = \"' + config.copyright_note + '\"\n')
+        f.write('version = \"' + version_data['httk_version'] + '\"\n')
+        f.write('version_date = \"' + version_data['httk_version_date'] + '\"\n')
+        f.write('copyright_note = \"' + version_data['httk_copyright_note'] + '\"\n')
         if self.httkroot is None:
             f.write('root = \"' + config.httk_root + '\"\n')
         else:
@@ -67,9 +69,9 @@ class HttkBuildCommand(build):
     def run(self):
         build.run(self)
         f = open(os.path.join(self.build_purelib,'httk','distdata.py'),'w')
-        f.write('version = \"' + config.version + '\"\n')
-        f.write('version_date = \"' + config.version_date + '\"\n')
-        f.write('copyright_note = \"' + config.copyright_note + '\"\n')
+        f.write('version = \"' + version_data['httk_version'] + '\"\n')
+        f.write('version_date = \"' + version_data['httk_version_date'] + '\"\n')
+        f.write('copyright_note = \"' + version_data['httk_copyright_note'] + '\"\n')
         if self.httkroot is None:
             f.write('root = \"' + config.httk_root + '\"\n')
         else:
@@ -102,7 +104,7 @@ setup(
     # For a discussion on single-sourcing the version across setup.py and the
     # project code, see
     # https://packaging.python.org/en/latest/single_source_version.html
-    version=config.version + buildtag,  # Required
+    version=version_data['httk_version'] + buildtag,  # Required
 
     # This is a one-line description or tagline of what your project does. This
     # corresponds to the "Summary" metadata field:
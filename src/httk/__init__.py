@@ -36,8 +36,18 @@ except Exception:
     raise Exception("Python version too old. Httk appear to be running on a version older than python 2.0!")
 
 from httk.config import *
+from httk.config.config import _lazy_version_attributes
 
-__version__ = version
+if sys.version_info >= (3, 7):
+    # Version data is determined by httk.config on first access
+    def __getattr__(name):
+        if name == '__version__':
+            name = 'version'
+        if name in _lazy_version_attributes:
+            return getattr(sys.modules['httk.config.config'], name)
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+else:
+    __version__ = version
 
 from httk.httkio import load, save
 import httk.iface
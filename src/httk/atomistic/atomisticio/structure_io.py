@@ -34,7 +34,7 @@ def load_struct(ioa, ext=None, filename=None):
         splitfilename = os.path.splitext(os.path.basename(filename))
         ext = splitfilename[1].lower()
 
-        if (ext == '.bz2' or ext == '.gz'):
+        if (ext == '.bz2' or ext == '.gz' or ext == '.zst'):
             splitfilename = os.path.splitext(splitfilename[0])
             ext = splitfilename[1]
 
@@ -70,7 +70,7 @@ def save_struct(struct, ioa, ext=None):
         splitfilename = os.path.splitext(os.path.basename(filename))
         ext = splitfilename[1]
 
-        if (ext == '.bz2' or ext == '.gz'):
+        if (ext == '.bz2' or ext == '.gz' or ext == '.zst'):
             splitfilename = os.path.splitext(splitfilename[0])
             ext = splitfilename[1]
 
@@ -20,5 +20,15 @@ Read and setup httk configuration and versioning data.
 See docstring in config.py for more info.
 """
 
+import sys
 from httk.config.config import *
 __doc__ = config.__doc__
+
+if sys.version_info >= (3, 7):
+    # Forward the lazily determined version attributes, which are not picked up by the import * above
+    from httk.config.config import _lazy_version_attributes
+
+    def __getattr__(name):
+        if name in _lazy_version_attributes:
+            return getattr(sys.modules['httk.config.config'], name)
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
@@ -20,20 +20,31 @@ Read and setup httk configuration and versioning data.
 
 httk_python_root is derived as the directory config.py is in + ..
 
-config is a configparser.config object where:
+config is a lightweight configparser.ConfigParser work-alike (wrapped so that missing options give None) where:
 
-- All assignments in a distdata.py file in httk_python_root are read into the section [general]
 - Read httk.cfg in httk_python_root
-- Using the latest definition of [general]/httk_root, read httk.cfg in that directory
-- Read ~/.httk/config
+- Read ~/.httk/config, where settings take precedence over those in httk.cfg
 
-In this config object, the section [general] is looked up for 'httk_root', which is exported as httk_root. If not present, 'root' is looked up in
-the section 'distdata'. If that is not present, the default of httk_python_root + ../.. is used.
+In this config object, the section [general] is looked up for 'httk_root' (relative to httk_python_root), which is exported as httk_root.
+Hence, a httk_root set in ~/.httk/config wins over one set in httk.cfg. If not present, the assignment of 'root' in
+distdata.py in httk_python_root is used. If that is not present, the default of httk_python_root + ../.. is used.
 
-If the file distdata.py in httk_python_root exists, the config object section [distdata] is looked up for version, version_date, and copyright_note,
-which are exported as httk_version, httk_version_date, httk_copyright_note. If this file does not exist, they identifiers are instead derived using the 'git' command.
+If the file distdata.py in httk_python_root exists, its assignments of version, version_date, and copyright_note are read,
+which are exported as httk_version, httk_version_date, httk_copyright_note (and as version, version_date, copyright_note). If this file does not exist, they identifiers are instead derived using the 'git' command.
 If that does not work, they are set to 'unknown', except for httk_copyright_note, which is set to a sensible default.
 
+If HEAD cannot be read from the files under .git, git is not run at all.
+
+If the option cache_git_version in section [general] is set to yes, version data obtained from a clean git checkout is cached
+in $XDG_CACHE_HOME/httk/version.json (default ~/.cache/httk/version.json), so that later imports do not need to run git. The
+cache is keyed on the commit hash of HEAD, the state of .git/index, and the state of the tags (refs/tags and packed-refs),
+all read directly from the files under .git. Unstaged edits to tracked files do not change any of these, so with this option
+a cached version is not reported as dirty until something is staged or committed; hence it is off by default. Nothing is
+cached if the commit of HEAD cannot be resolved from the files under .git (e.g., with the reftable format).
+determine_version_data(use_cache=False) always asks git; setup.py uses this so that distdata.py gets the exact version.
+
+On Python 3.7 and later the version data is only determined when one of these attributes is first accessed.
+
 This python file has no dependencies except for the standard library (neither within httk or outside).
 It will always remain safe to import by itself, e.g.::
 
@@ -50,8 +61,8 @@ _default_httk_root = '../..'
 _default_copyright_name = "Rickard Armiento, et al."
 _default_copyright_note = "(c) 2012 - 2018, " + _default_copyright_name
 
-import sys, os, inspect, subprocess, datetime
-import codecs
+import sys, os, subprocess, datetime, tempfile
+import codecs, json, re
 
 try:
     python_major_version = sys.version_info[0]
@@ -60,71 +71,353 @@ except Exception:
     raise RuntimeError("Python version too old, this appears to be a version of python older than python 2.0!")
 
 if sys.version_info[0] == 3:
-    from io import StringIO
     import configparser
 else:
-    from StringIO import StringIO
     import ConfigParser as configparser
 
-python_root = os.path.realpath(os.path.join(os.path.abspath(os.path.split(inspect.getfile(inspect.currentframe()))[0]),'..'))
+python_root = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
 httk_root = None
-_config = configparser.ConfigParser()
+_user_cfgpath = os.path.expanduser('~/.httk/config')
+_version_cache = {}
+_distdata = None
+_git_dir = None
+_bypass_git_version_lookup = False
+_cache_git_version = False
+_config_is_read = False
+_git_timeout = 10
+_distdata_assignment_re = re.compile(r'^\s*(\w+)\s*=\s*"([^"]*)"', re.M)
+_cfg_section_re = re.compile(r'^\[([^\]]+)\][ \t\r]*$', re.M)
+_cfg_option_re = re.compile(r'^([^=:\s;#\[][^=:\n]*?)[ \t]*[=:][ \t]*(.*?)[ \t\r]*$', re.M)
+_cfg_boolean_states = {'1': True, 'yes': True, 'true': True, 'on': True,
+                       '0': False, 'no': False, 'false': False, 'off': False}
+_unset = object()
+
+class _FastConfig(object):
+    """
+    Minimal stand-in for configparser.ConfigParser, sufficient for the [section] / option = value syntax of the httk.cfg files.
+
+    Missing sections and options raise configparser.NoSectionError and configparser.NoOptionError, as for ConfigParser.
+    As for ConfigParser, options in a [DEFAULT] section apply to every section, and [DEFAULT] is not listed by sections().
+    Multi-line values and interpolation are not supported.
+    """
+    default_section = 'DEFAULT'
+
+    def __init__(self):
+        self._defaults = {}
+        self._sections = {}
+
+    def read(self, filenames):
+        read_ok = []
+        for filename in filenames:
+            try:
+                with open(filename, 'r') as fp:
+                    text = fp.read()
+            except IOError:
+                continue
+            parts = _cfg_section_re.split(text)
+            for section, body in zip(parts[1::2], parts[2::2]):
+                section = section.strip()
+                if section == self.default_section:
+                    options = self._defaults
+                else:
+                    options = self._sections.setdefault(section, {})
+                for option, value in _cfg_option_re.findall(body):
+                    options[option.lower()] = value
+            read_ok.append(filename)
+        return read_ok
+
+    def sections(self):
+        return list(self._sections.keys())
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def has_option(self, section, option):
+        option = option.lower()
+        if section == self.default_section:
+            return option in self._defaults
+        return section in self._sections and (option in self._sections[section] or option in self._defaults)
+
+    def items(self, section):
+        items = dict(self._defaults)
+        if section != self.default_section:
+            try:
+                items.update(self._sections[section])
+            except KeyError:
+                raise configparser.NoSectionError(section)
+        return list(items.items())
+
+    def get(self, section, option, fallback=_unset):
+        option = option.lower()
+        if section == self.default_section:
+            options = self._defaults
+        else:
+            options = self._sections.get(section)
+        if options is not None:
+            if option in options:
+                return options[option]
+            if option in self._defaults:
+                return self._defaults[option]
+        if fallback is not _unset:
+            return fallback
+        if options is None:
+            raise configparser.NoSectionError(section)
+        raise configparser.NoOptionError(option, section)
+
+    def getboolean(self, section, option, fallback=_unset):
+        value = self.get(section, option, fallback)
+        if value is fallback:
+            return fallback
+        try:
+            return _cfg_boolean_states[value.lower()]
+        except KeyError:
+            raise ValueError("Not a boolean: " + value)
+
+_config = _FastConfig()
 
 def read_config():
-    global python_root, httk_root, _config
+    global python_root, httk_root, _config, _distdata, _git_dir, _bypass_git_version_lookup, _cache_git_version, _config_is_read
+
+    if _config_is_read:
+        return
+    _config_is_read = True
 
+    # distdata.py only holds simple key = "value" assignments written by setup.py, so there is no need for a full config parser
     try:
         with open(os.path.join(python_root, "distdata.py"), 'r') as fp:
-            distdata_str = fp.read()
-            ini_str = '[distdata]\n' + distdata_str
-            ini_fp = StringIO(ini_str)
-            _config.readfp(ini_fp)
-            httk_root = os.path.realpath(os.path.join(python_root,_config.get('distdata','root').strip('"')))
-    except (IOError, configparser.NoSectionError, configparser.NoOptionError):
+            _distdata = dict(_distdata_assignment_re.findall(fp.read()))
+    except IOError:
+        _distdata = None
+
+    if _distdata is not None and 'root' in _distdata:
+        httk_root = os.path.realpath(os.path.join(python_root,_distdata['root']))
+    else:
         httk_root = os.path.realpath(os.path.join(python_root,_default_httk_root))
 
-    config_files = []
-    internal_cfgpathstr = os.path.join(python_root, 'httk.cfg')
-    _config.read([internal_cfgpathstr])
+    _config.read([os.path.join(python_root, 'httk.cfg'), _user_cfgpath])
 
-    try:
-        httk_root_cfg = _config.get('general','httk_root')
+    httk_root_cfg = _config.get('general', 'httk_root', fallback=None)
+    if httk_root_cfg is not None:
         httk_root = os.path.join(python_root,httk_root_cfg)
-    except (configparser.NoSectionError, configparser.NoOptionError):
-        pass
 
-    global_cfgpathstr = os.path.join(python_root, 'httk.cfg')
-    local_cfgpathstr = os.path.expanduser('~/.httk/config')
+    try:
+        _bypass_git_version_lookup = _config.getboolean('general', 'bypass_git_version_lookup', fallback=False)
+    except ValueError:
+        sys.stderr.write("Note: ignoring invalid value of bypass_git_version_lookup in httk configuration: " +
+                         _config.get('general', 'bypass_git_version_lookup') + "\n")
+        _bypass_git_version_lookup = False
 
     try:
-        httk_root_cfg = _config.get('general','httk_root')
-        httk_root = os.path.join(python_root,httk_root_cfg)
-    except (configparser.NoSectionError, configparser.NoOptionError):
+        _cache_git_version = _config.getboolean('general', 'cache_git_version', fallback=False)
+    except ValueError:
+        sys.stderr.write("Note: ignoring invalid value of cache_git_version in httk configuration: " +
+                         _config.get('general', 'cache_git_version') + "\n")
+        _cache_git_version = False
+
+    _git_dir = _find_git_dir(httk_root)
+
+def _find_git_dir(root):
+    git_path = os.path.join(root, '.git')
+    if os.path.isdir(git_path):
+        return git_path
+    # In submodules and worktrees .git is a file pointing to the actual git directory
+    try:
+        with open(git_path, 'r') as fp:
+            line = fp.readline().strip()
+    except IOError:
+        return None
+    if line.startswith('gitdir: '):
+        return os.path.join(root, line[len('gitdir: '):])
+    return None
+
+def _common_git_dir(git_dir):
+    # Worktrees keep refs in the common git directory
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r') as fp:
+            return os.path.join(git_dir, fp.read().strip())
+    except IOError:
+        return git_dir
+
+def _read_head_sha(git_dir):
+    # Resolves HEAD by reading the files under the git directory, which is much cheaper than running git.
+    # Raises IOError if HEAD cannot be read. Returns None if HEAD is readable but its ref cannot be resolved this way,
+    # e.g., in a repository without commits or one that stores refs in a format not handled here (such as reftable).
+    with open(os.path.join(git_dir, 'HEAD'), 'r') as fp:
+        head = fp.read().strip()
+    if not head.startswith('ref: '):
+        return head or None
+    ref = head[len('ref: '):]
+    refs_dir = _common_git_dir(git_dir)
+    try:
+        with open(os.path.join(refs_dir, ref), 'r') as fp:
+            return fp.read().strip() or None
+    except IOError:
+        pass
+    try:
+        with open(os.path.join(refs_dir, 'packed-refs'), 'r') as fp:
+            for line in fp:
+                fields = line.split()
+                if len(fields) == 2 and fields[1] == ref:
+                    return fields[0]
+    except IOError:
         pass
+    return None
 
-    _config.read([global_cfgpathstr, local_cfgpathstr])
+def _start_git(*args):
+    # No file descriptors worth protecting are open here, so skip the cost of closing them all in the child.
+    # stderr is piped rather than sent to os.devnull, so no file needs to be opened for it; communicate() discards it.
+    return subprocess.Popen(("git", "-C", python_root) + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=False)
+
+def _finish_git(proc, args):
+    command = "git " + " ".join(args)
+    if sys.version_info[0] >= 3:
+        try:
+            out = proc.communicate(timeout=_git_timeout)[0]
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise RuntimeError("Command '" + command + "' timed out after " + str(_git_timeout) + " seconds")
+    else:
+        out = proc.communicate()[0]
+    if proc.returncode != 0:
+        raise RuntimeError("Command '" + command + "' returned non-zero exit status " + str(proc.returncode))
+    return codecs.decode(out, 'utf-8').strip()
+
+def _reap_git(proc):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except OSError:
+            pass
+        proc.communicate()
 
-def determine_version_data():
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+        return [st.st_mtime, st.st_size]
+    except OSError:
+        return [None, None]
+
+def _git_state_key(head_sha):
+    # The index is included to catch changes in what is staged, and refs/tags and packed-refs to catch new or moved tags,
+    # which change what git describe reports. Edits to the working tree that are not staged are not detected by this key.
+    # head_sha is None when HEAD could not be resolved without running git, in which case it is left out of the key.
+    common_dir = _common_git_dir(_git_dir)
+    state = (_stat_key(os.path.join(_git_dir, 'index')) + _stat_key(os.path.join(common_dir, 'refs', 'tags')) +
+             _stat_key(os.path.join(common_dir, 'packed-refs')))
+    if head_sha is None:
+        return state
+    return [head_sha] + state
+
+def _version_cache_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'httk', 'version.json')
+
+def _read_version_cache(state_key):
+    try:
+        with open(_version_cache_path(), 'r') as fp:
+            entry = json.load(fp)[httk_root]
+        if entry['key'] != state_key:
+            return None
+        return {'httk_version':str(entry['httk_version']), 'httk_version_date':str(entry['httk_version_date']),
+                'httk_copyright_note':str(entry['httk_copyright_note'])}
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _write_version_cache(state_key, version_data):
+    cachepath = _version_cache_path()
+    cachedir = os.path.dirname(cachepath)
+    try:
+        with open(cachepath, 'r') as fp:
+            cache = json.load(fp)
+        if not isinstance(cache, dict):
+            cache = {}
+    except (IOError, OSError, ValueError):
+        cache = {}
+    entry = dict(version_data)
+    entry['key'] = state_key
+    cache[httk_root] = entry
+
+    tmppath = None
+    try:
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        fd, tmppath = tempfile.mkstemp(dir=cachedir, prefix='.version.json.')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(cache, fp)
+        # Atomic rename, so concurrently starting processes never see a partially written file
+        getattr(os, 'replace', os.rename)(tmppath, cachepath)
+    except (IOError, OSError):
+        if tmppath is not None and os.path.exists(tmppath):
+            os.remove(tmppath)
+
+def determine_version_data(use_cache=None):
+    """
+    Returns a dict with httk_version, httk_version_date and httk_copyright_note.
+
+    If use_cache is None, the on-disk version cache is used if cache_git_version is set in the httk configuration.
+    If use_cache is False, git is always run (unless the version comes from distdata.py), bypassing both caches.
+    """
     global python_root, httk_root, _config
 
-    httk_version = None
-    if os.path.exists(os.path.join(python_root, "distdata.py")):
+    read_config()
+
+    if use_cache is None:
+        use_cache = _cache_git_version
+
+    # Memoized on the state of the .git directory, so repeated calls within the same process do not run git again
+    head_sha = None
+    head_readable = False
+    if _git_dir is not None:
         try:
-            httk_version = _config.get('distdata','version').strip('"')
-            httk_version_date = _config.get('distdata','version_date').strip('"')
-            httk_copyright_note = _config.get('distdata','copyright_note').strip('"')
-        except (configparser.NoSectionError, configparser.NoOptionError):
+            head_sha = _read_head_sha(_git_dir)
+            head_readable = True
+        except IOError:
             pass
+    state_key = _git_state_key(head_sha) if head_readable else []
+    cache_key = (httk_root, tuple(state_key))
+    if use_cache is not False and cache_key in _version_cache:
+        return _version_cache[cache_key]
+
+    httk_version = None
+    if _distdata is not None:
+        try:
+            httk_version = _distdata['version']
+            httk_version_date = _distdata['version_date']
+            httk_copyright_note = _distdata['copyright_note']
+        except KeyError:
+            httk_version = None
 
     if httk_version is None:
-        if (not _config.getboolean('general', 'bypass_git_version_lookup')) and os.path.exists(os.path.join(httk_root,'.git')):
+        if (not _bypass_git_version_lookup) and head_readable:
+            # Without the commit hash the key cannot tell commits apart, so then only git itself is trusted
+            use_disk_cache = use_cache and head_sha is not None
+            cached_version_data = _read_version_cache(state_key) if use_disk_cache else None
+            if cached_version_data is not None:
+                _version_cache[cache_key] = cached_version_data
+                return cached_version_data
             try:
-                httk_version = subprocess.check_output(["git", "describe","--dirty","--always"], cwd=python_root).strip()
-                httk_version = codecs.decode(httk_version, 'utf-8')
-                if httk_version.endswith('-dirty'):
+                # Start both git commands before waiting on either, so that their latencies overlap
+                describe_args = ("describe", "--dirty", "--always")
+                log_args = ("log", "-1", "--format=%ct")
+                describe_proc = _start_git(*describe_args)
+                try:
+                    log_proc = _start_git(*log_args)
+                except Exception:
+                    _reap_git(describe_proc)
+                    raise
+                try:
+                    httk_version = _finish_git(describe_proc, describe_args)
+                    commit_timestamp = _finish_git(log_proc, log_args)
+                finally:
+                    # If either command failed, make sure neither process is left running or unreaped
+                    _reap_git(describe_proc)
+                    _reap_git(log_proc)
+                git_dirty = httk_version.endswith('-dirty')
+                if git_dirty:
                     _git_commit_datetime = datetime.datetime.now()
                 else:
-                    _git_commit_datetime = datetime.datetime.fromtimestamp(int(subprocess.check_output(["git", "log","-1",'--format=%ct'],cwd=python_root)))
+                    _git_commit_datetime = datetime.datetime.fromtimestamp(int(commit_timestamp))
                 httk_version_date = "%d-%02d-%02d" % (_git_commit_datetime.year,_git_commit_datetime.month, _git_commit_datetime.day)
                 httk_copyright_note = "(c) 2012 - " + str(_git_commit_datetime.year) + " " + _default_copyright_name
 
@@ -135,6 +428,11 @@ def determine_version_data():
                 if httk_version.endswith('-dirty'):
                     httk_version = httk_version.replace('-dirty','.d')
 
+                # Dirty versions are dated by the current time and are not persisted
+                if use_disk_cache and not git_dirty:
+                    _write_version_cache(state_key, {'httk_version':httk_version, 'httk_version_date':httk_version_date,
+                                                     'httk_copyright_note':httk_copyright_note})
+
             except Exception as e:
                 sys.stderr.write("Note: failed to obtain httk version from git: " + str(e) + "\n")
                 httk_version = 'unknown'
@@ -146,28 +444,49 @@ def determine_version_data():
             httk_version_date = 'unknown'
             httk_copyright_note = _default_copyright_note
 
-    return {'httk_version':httk_version, 'httk_version_date':httk_version_date, 'httk_copyright_note':httk_copyright_note}
+    version_data = {'httk_version':httk_version, 'httk_version_date':httk_version_date, 'httk_copyright_note':httk_copyright_note}
+    _version_cache[cache_key] = version_data
+    return version_data
 
-read_config()
-_version_data = determine_version_data()
-version = _version_data['httk_version']
-if version == 'unknown':
-    major_version = '0'
-    minor_version = '0'
-    patch_version = 'unknown'
-else:
-    try:
-        _version_list = version.split('.')
-        major_version = int(_version_list[0])
-        minor_version = int(_version_list[1])
-        patch_version = '.'.join(_version_list[2:])
-    except Exception:
-        print("Warning: could not determine version numbers. Version string was:"+str(version))
+_lazy_version_attributes = ('version', 'major_version', 'minor_version', 'patch_version', 'version_date', 'copyright_note',
+                            'httk_version', 'httk_version_date', 'httk_copyright_note')
+
+def _version_attributes():
+    version_data = determine_version_data()
+    version = version_data['httk_version']
+    if version == 'unknown':
         major_version = '0'
         minor_version = '0'
         patch_version = 'unknown'
-version_date = _version_data['httk_version_date']
-copyright_note = _version_data['httk_copyright_note']
+    else:
+        try:
+            _version_list = version.split('.')
+            major_version = int(_version_list[0])
+            minor_version = int(_version_list[1])
+            patch_version = '.'.join(_version_list[2:])
+        except Exception:
+            print("Warning: could not determine version numbers. Version string was:"+str(version))
+            major_version = '0'
+            minor_version = '0'
+            patch_version = 'unknown'
+    return {'version':version, 'major_version':major_version, 'minor_version':minor_version, 'patch_version':patch_version,
+            'version_date':version_data['httk_version_date'], 'copyright_note':version_data['httk_copyright_note'],
+            'httk_version':version, 'httk_version_date':version_data['httk_version_date'],
+            'httk_copyright_note':version_data['httk_copyright_note']}
+
+read_config()
+
+if sys.version_info >= (3, 7):
+    # The version attributes are only determined on first access (PEP 562), so that importing this module
+    # does not need to run git unless the version is actually used.
+    def __getattr__(name):
+        if name in _lazy_version_attributes:
+            attributes = _version_attributes()
+            globals().update(attributes)
+            return attributes[name]
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+else:
+    globals().update(_version_attributes())
 
 class ExceptionlessConfig(object):
     def __init__(self, config):
@@ -27,7 +27,6 @@ also of the data being used.
 """
 from __future__ import print_function
 from collections import OrderedDict
-from httk.versioning import httk_version, httk_copyright_note, httk_version_date
 
 # TODO: Convert to using real instances of the core.reference.Reference class instead.
 
@@ -58,6 +57,9 @@ def print_citations():
     global cancel_print_citations
     if cancel_print_citations:
         return
+    # Imported here, so that the version lookup only happens if citations are actually printed
+    from httk.versioning import httk_version, httk_copyright_note, httk_version_date
+
     #authors = {}
     #for citation in module_citations:
     #    module_authors = module_citations[citation]
@@ -43,6 +43,11 @@ try:
 except ImportError:
     pass
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 def universal_opener(other):
     #if isinstance(other, file):
@@ -313,6 +318,21 @@ def zdecompressor(f, mode, *args):
     return StringIO(result[0])
 
 
+def zstdopen(filename, mode, *args):
+    """
+    Open a zstandard (.zst) compressed file. This needs the optional zstandard module.
+    As for bz2 files, the file is opened in text mode unless mode contains 'b', and any further
+    arguments are passed on (to zstandard.open).
+    """
+    if zstandard is None:
+        raise IOError("zstdopen: the zstandard module is needed to open: "+str(filename))
+
+    if not 'b' in mode and not 't' in mode:
+        mode += 't'
+
+    return zstandard.open(filename, mode, *args)
+
+
 def cleveropen(filename, mode, *args):
     basename_no_ext, ext = os.path.splitext(filename)
 
@@ -322,6 +342,8 @@ def cleveropen(filename, mode, *args):
         return gzip.GzipFile(filename, mode, *args)
     elif ext.lower() == '.z':
         return gzip.GzipFile(filename, mode, *args)
+    elif ext.lower() == '.zst':
+        return zstdopen(filename, mode, *args)
     else:
         try:
             return open(filename, mode, *args)
@@ -351,6 +373,10 @@ def cleveropen(filename, mode, *args):
             return zdecompressor(filename+".Z", mode, *args)
         except (IOError, NameError):
             pass
+        try:
+            return zstdopen(filename+".zst", mode, *args)
+        except (IOError, NameError):
+            pass
         if not os.path.exists(filename):
             raise Exception("IOAdapters.cleveropen: file not found: "+str(filename))
         else:
@@ -294,6 +294,27 @@ class FracVector(Vector):
 
         return cls(noms, denom)
 
+    @classmethod
+    def from_strings(cls, rows, simplify=True, min_accuracy=fractions.Fraction(1, 10000)):
+        """
+        Create a FracVector from a list of rows of number strings, e.g., the cell or coordinates read from a POSCAR file.
+
+        Gives the same result as FracVector.create(rows, simplify=simplify, min_accuracy=min_accuracy), but without
+        the per-element type checks that create() needs to handle any kind of nested input.
+        """
+        fracs = [[any_to_fraction(x, min_accuracy=min_accuracy) for x in row] for row in rows]
+
+        lcd = 1
+        for row in fracs:
+            for x in row:
+                lcd = lcd * x.denominator // calc_gcd(lcd, x.denominator)
+        noms = tuple(tuple(x.numerator * (lcd // x.denominator) for x in row) for row in fracs)
+
+        v = cls(noms, lcd)
+        if simplify and v.denom != 1:
+            v = v.simplify()
+        return v
+
     @classmethod
     def _create_func(cls, data, func, find_best_rational = True, **args):
         def apply_func(arg):
@@ -450,7 +471,15 @@ class FracVector(Vector):
         #denom = float(self.denom)
         #return nested_map_list(lambda x: float(x) / denom, self.noms)
         #return nested_map_list(lambda x: "%."+str(accuracy)+"f" % (fractions.Fraction(x, self.denom),), self.noms)
-        return nested_map_list(lambda x: ("%."+str(accuracy)+"f") % (fractions.Fraction(x, self.denom),), self.noms)
+        # Formatting a Fraction goes via float(nom/denom) anyway, and exact integer true division gives that
+        # same correctly rounded float without building a Fraction per element.
+        fmt = "%."+str(accuracy)+"f"
+        denom = self.denom
+        truediv = operator.truediv
+        if len(self.dim) == 2:
+            # Lists of coordinates are by far the most common case, handle them without the recursion
+            return [[fmt % (truediv(x, denom),) for x in row] for row in self.noms]
+        return nested_map_list(lambda x: fmt % (truediv(x, denom),), self.noms)
 
     def to_string(self, accuracy=8):
         """
@@ -458,7 +487,7 @@ class FracVector(Vector):
         """
         #denom = float(self.denom)
         #return nested_map_list(lambda x: float(x) / denom, self.noms)
-        return ("%."+str(accuracy)+"f") % (fractions.Fraction(self.nom, self.denom),)
+        return ("%."+str(accuracy)+"f") % (operator.truediv(self.nom, self.denom),)
 
     def to_fraction(self):
         """
@@ -605,7 +634,7 @@ class FracVector(Vector):
             gcd = self._reduce_over_noms(lambda x, y: calc_gcd(x, abs(y)), initializer=self.denom)
             if gcd != 1:
                 denom = denom // gcd
-                noms = self._map_over_noms(lambda x: int(x / gcd))
+                noms = self._map_over_noms(lambda x: x // gcd)
 
         return self.__class__(noms, denom)
 
@@ -1228,6 +1257,14 @@ class FracScalar(FracVector):
 
         return v
 
+    @classmethod
+    def from_string(cls, s):
+        """
+        Create a FracScalar from a number string. Gives the same result as FracScalar.create(s).
+        """
+        frac = fractions.Fraction(s)
+        return cls(frac.numerator, frac.denominator)
+
 # Utility functions
 
 
@@ -1427,6 +1464,17 @@ def main():
     data3 = [[fractions.Fraction(185,23), 0, 0], [0, fractions.Fraction(67,18), 0], [0, 0, fractions.Fraction(59,8)]]
     print(FracVector.create(data3))
 
+    # Simplification must be exact also for nominators beyond the precision of a float
+    big = FracVector([[3 * (2**60 + 1), 6 * (2**55 + 3)], [9, 3 * (2**53 + 1)]], 3 * 7)
+    simplified = big.simplify()
+    assert simplified.denom == 7
+    assert simplified.noms == ((2**60 + 1, 2 * (2**55 + 3)), (3, 2**53 + 1))
+    from httk.core.vectors.mutablefracvector import MutableFracVector
+    mbig = MutableFracVector.from_FracVector(big)
+    mbig.set_simplify()
+    assert mbig.denom == 7
+    assert mbig.noms == [[2**60 + 1, 2 * (2**55 + 3)], [3, 2**53 + 1]]
+
     exit(0)
 
     print("PI=",float(frac_pi(prec=fractions.Fraction(1,100000000000))),math.pi)
@@ -223,8 +223,8 @@ class MutableFracVector(FracVector, MutableVector):
         if self.denom != 1:
             gcd = self._reduce_over_noms(lambda x, y: calc_gcd(x, abs(y)), initializer=self.denom)
             if gcd != 1:
-                self.denom = self.denom / gcd
-                self._inmap_over_noms(lambda x: int(x / gcd))
+                self.denom = self.denom // gcd
+                self._inmap_over_noms(lambda x: x // gcd)
 
     def set_set_denominator(self, resolution=1000000000):
         """
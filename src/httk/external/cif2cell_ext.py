@@ -24,7 +24,7 @@ from httk.atomistic import Structure
 citation.add_ext_citation('cif2cell', "Torbjörn Björkman")
 
 from httk import config
-from httk.external.command import Command, find_executable
+from httk.external.command import Command, find_executable, external_program_versions
 import httk
 import httk.iface
 
@@ -40,8 +40,7 @@ try:
     if cif2cell_path is None or cif2cell_path == "":
         from httk.config import httk_root
         path = os.path.join(httk_root, 'External')
-        externaldirs = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
-        extvers = [name.split('-')[1] for name in externaldirs if name.split('-')[0] == "cif2cell"]
+        extvers = external_program_versions(path, "cif2cell")
         extvers = sorted(extvers, key=lambda x: map(int, x.split('.')))
         bestversion = 'cif2cell-'+extvers[-1]
         cif2cell_path = os.path.join(path, bestversion, 'cif2cell')
@@ -176,6 +176,20 @@ class Command(object):
         return self.process.stdin
 
 
+def external_program_versions(path, program):
+    """
+    Returns the versions of program that are installed as subdirectories named <program>-<version> of path.
+    """
+    prefix = program+'-'
+    try:
+        # os.scandir gets the file type with the directory listing, so no extra stat call is needed per entry
+        names = [entry.name for entry in os.scandir(path) if entry.name.startswith(prefix) and entry.is_dir()]
+    except AttributeError:
+        # Python < 3.5
+        names = [name for name in os.listdir(path) if name.startswith(prefix) and os.path.isdir(os.path.join(path, name))]
+    return [name[len(prefix):].split('-')[0] for name in names]
+
+
 def find_executable(executables, config_name):
     if not is_sequence(executables):
         executables = [executables]
@@ -189,8 +203,7 @@ def find_executable(executables, config_name):
     else:
         try:
             path = os.path.join(httk_root, 'External')
-            externaldirs = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
-            extvers = [name.split('-')[1] for name in externaldirs if name.split('-')[0] == config_name]
+            extvers = external_program_versions(path, config_name)
             extvers = sorted(extvers, key=lambda x: map(int, x.split('.')))
             bestversion = config_name+'-'+extvers[-1]
             for executable in executables:
@@ -15,7 +15,8 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, shutil, math
+import os, shutil, math, re, fractions, io
+from itertools import islice
 
 import httk
 from httk import config
@@ -23,9 +24,17 @@ from httk.core.template import apply_templates
 from httk.atomistic.data import periodictable
 from httk.core.ioadapters import cleveropen
 from httk.core import *
-from httk.core.basic import mkdir_p, micro_pyawk
+from httk.core.basic import mkdir_p
 from httk.atomistic import Structure
-from httk.atomistic.structureutils import cartesian_to_reduced
+
+
+# The pseudopotential library does not change while we run, so POTCARs are only read and parsed once per species
+_pseudopotential_cache = {}
+_zval_cache = {}
+_zval_re = re.compile(r"^ *POMASS.*; *ZVAL *= *(\S+)", re.M)
+
+# Symbols that periodictable.atomic_symbol would return as they are
+_atomic_symbols = frozenset(periodictable.symbols)
 
 
 def get_pseudopotential(species, poscarspath=None):
@@ -47,6 +56,10 @@ def get_pseudopotential(species, poscarspath=None):
 
     poscarspath = os.path.expanduser(poscarspath)
 
+    key = (species, poscarspath)
+    if key in _pseudopotential_cache:
+        return _pseudopotential_cache[key]
+
     for priority in ["_3", "_2", "_d", "_pv", "_sv", "", "_h", "_s"]:
         basepath = os.path.join(poscarspath, species)
         if os.path.exists(basepath+priority):
@@ -54,6 +67,7 @@ def get_pseudopotential(species, poscarspath=None):
                 f = cleveropen(os.path.join(basepath+priority, 'POTCAR'), 'r')
                 data = f.read()
                 f.close()
+                _pseudopotential_cache[key] = data
                 return data
             except Exception:
                 raise
@@ -62,6 +76,25 @@ def get_pseudopotential(species, poscarspath=None):
     raise Exception("httk.iface.vasp_if.get_pseudopotentials: could not find a suitable pseudopotential for "+str(species))
 
 
+def get_potcar_zval(pp):
+    """
+    Returns the valence (ZVAL) given in the POTCAR text pp.
+    """
+    if pp in _zval_cache:
+        return _zval_cache[pp]
+
+    # ZVAL is in the header, so first look in whole lines within the first few kB before searching everything
+    header_end = pp.rfind('\n', 0, 4096)
+    match = _zval_re.search(pp, 0, header_end) if header_end > 0 else None
+    if match is None:
+        match = _zval_re.search(pp)
+    if match is None:
+        raise Exception("vasp_if.get_potcar_zval: Could not read ZVAL from potcar file")
+    zval = float(match.group(1))
+    _zval_cache[pp] = zval
+    return zval
+
+
 def write_kpoints_file(fio, kpoints, comment=None, mp=True, gamma_centered=False):
     """
     """
@@ -102,36 +135,43 @@ def get_magmom(symbol):
 
 #magions = ['Sc','Ti','V','Cr','Mn','Fe','Co','Ni','Cu','Zn','Y','Zr','Nb','Mo','Tc','Ru','Rh','Pd','Ag','Cd','La','Hf','Ta','W','Re','Os','Ir','Pt','Au','Hg','Ce','Pr','Nd','Pm','Sm','Eu','Gd','Tb','Dy','Ho','Er','Tm','Yb','Lu','Th','Pa','U']
 # From: A. Jain et al. / Computational Materials Science 50 (2011) 2295-2310
-magions = ['Ag', 'Au', 'Cd', 'Ce', 'Co', 'Cr', 'Cu', 'Dy', 'Er', 'Eu', 'Fe', 'Gd', 'Hf', 'Hg', 'Ho', 'Ir', 'La', 'Lu', 'Mn', 'Mo', 'Nb', 'Nd', 'Ni', 'Os', 'Pa', 'Pd', 'Pm', 'Pr', 'Pt', 'Re', 'Rh', 'Ru', 'Sc', 'Sm', 'Ta', 'Tb', 'Tc', 'Th', 'Ti', 'Tm', 'U', 'V', 'W', 'Y', 'Yb', 'Zn', 'Zr']
+magions = frozenset(['Ag', 'Au', 'Cd', 'Ce', 'Co', 'Cr', 'Cu', 'Dy', 'Er', 'Eu', 'Fe', 'Gd', 'Hf', 'Hg', 'Ho', 'Ir', 'La', 'Lu', 'Mn', 'Mo', 'Nb', 'Nd', 'Ni', 'Os', 'Pa', 'Pd', 'Pm', 'Pr', 'Pt', 'Re', 'Rh', 'Ru', 'Sc', 'Sm', 'Ta', 'Tb', 'Tc', 'Th', 'Ti', 'Tm', 'U', 'V', 'W', 'Y', 'Yb', 'Zn', 'Zr'])
 dualmag = {'O': ['Co'], 'S': ['Mn', 'Fe', 'Cr', 'Co']}
 
 
-def is_dualmagnetic(ion, ionlist):
-    for i in range(len(ionlist)):
-        if ionlist[i] in dualmag:
-            if ion in dualmag[ionlist[i]]:
-                return True
-    return False
+def dualmagnetic_ions(ionlist):
+    """
+    Returns the set of ions that are dualmagnetic in a structure with the ions in ionlist.
+    """
+    dualions = set()
+    for ion in set(ionlist):
+        if ion in dualmag:
+            dualions.update(dualmag[ion])
+    return dualions
 
 
-def magnetization_recurse(basemags, dualmags, high, low):
-    if len(dualmags) == 0:
-        return [basemags]
+def is_dualmagnetic(ion, ionlist):
+    return ion in dualmagnetic_ions(ionlist)
 
-    index = dualmags.pop()
-    basemags[index] = high
-    hi_list = magnetization_recurse(list(basemags), list(dualmags), high, low)
-    basemags[index] = low
-    low_list = magnetization_recurse(list(basemags), list(dualmags), high, low)
 
-    return hi_list + low_list
+def magnetization_recurse(basemags, dualmags, high, low):
+    # Enumerates all high/low combinations of the dualmagnetic sites. Bit b of the mask selects low for dualmags[b],
+    # which gives the same order as the recursion this replaces (last site varies slowest, high before low).
+    mags = []
+    for mask in range(1 << len(dualmags)):
+        row = list(basemags)
+        for b, index in enumerate(dualmags):
+            row[index] = low if (mask >> b) & 1 else high
+        mags.append(row)
+    return mags
 
 
 def get_magnetizations(ionlist, high, low):
     basemags = []
     dualmags = []
+    dualions = dualmagnetic_ions(ionlist)
     for i in range(len(ionlist)):
-        if is_dualmagnetic(ionlist[i], ionlist):
+        if ionlist[i] in dualions:
             basemags.append(None)
             dualmags.append(i)
         else:
@@ -150,6 +190,11 @@ def copy_template(dirtemplate, dirname, templatename):
     shutil.copytree(dirtemplate, template, True)
 
 
+# Only the first character of these POSCAR lines is significant
+_poscar_selective_dynamics = frozenset('Ss')
+_poscar_cartesian = frozenset('CcKk')
+
+
 def poscar_to_strs(fio, included_decimals=''):
     """
     Parses a file on VASPs POSCAR format. Returns
@@ -199,31 +244,23 @@ def poscar_to_strs(fio, included_decimals=''):
     N = sum(counts)
 
     coordtype_or_selectivedynamics = next(fi).strip()
-    if coordtype_or_selectivedynamics[0] in 'Ss':
+    if coordtype_or_selectivedynamics[:1] in _poscar_selective_dynamics:
         # Skip row if selective dynamics specifier
         coordtype = next(fi).strip()
     else:
         coordtype = coordtype_or_selectivedynamics
 
-    if coordtype[0] in 'CcKk':
+    if coordtype[:1] in _poscar_cartesian:
         coords_reduced = True
     else:
         coords_reduced = False
 
-    coords = []
-    if included_decimals == '':
-        for i in range(N):
-            nxt = next(fi)
-            strcoord = nxt.strip().split()[:3]
-            coord = list(map(lambda x: x.strip(), strcoord))
-            coords.append(coord)
-    else:
-        for i in range(N):
-            nxt = next(fi)
-            strcoord = nxt.strip().split()[:3]
-            tempcoord = list(map(lambda x: x.strip(), strcoord))
-            coord = list(map(lambda x: x[0:2+included_decimals], tempcoord))
-            coords.append(coord)
+    coords = [line.split()[:3] for line in islice(fi, N)]
+    if len(coords) < N:
+        raise Exception("vasp_if.poscar_to_strs: POSCAR ended after "+str(len(coords))+" of "+str(N)+" coordinates.")
+    if included_decimals != '':
+        end = 2+included_decimals
+        coords = [[x[:end] for x in coord] for coord in coords]
 
     return (cell, scale, vol, coords, coords_reduced, counts, occupations, comment)
 
@@ -231,23 +268,25 @@ def poscar_to_strs(fio, included_decimals=''):
 def poscar_to_structure(f, included_decimals=''):
     cell, scale, volume, coords, coords_reduced, counts, occupations, comment = poscar_to_strs(f, included_decimals)
 
-    frac_cell = FracVector.create(cell, simplify=True)
+    # poscar_to_strs always gives strings, so the string-only factories can be used
+    frac_cell = FracVector.from_strings(cell)
     counts = [int(x) for x in counts]
 
     if coords_reduced:
-        frac_coords = cartesian_to_reduced(cell, coords)
+        # Invert the already parsed cell once and transform all coordinates in one matrix product
+        frac_coords = (FracVector.from_strings(coords) * frac_cell.inv()).simplify()
     else:
-        frac_coords = FracVector.create(coords, simplify=True)
+        frac_coords = FracVector.from_strings(coords)
 
     if volume is not None:
-        volume = FracScalar.create(volume)
+        volume = FracScalar.from_string(volume)
 
     if scale is not None:
-        scale = FracScalar.create(scale)
+        scale = FracScalar.from_string(scale)
 
-    newoccupations = []
-    for occupation in occupations:
-        newoccupations.append(periodictable.atomic_number(occupation))
+    # Occupations read from a POSCAR are already plain ints, which periodictable.atomic_number passes through unchanged
+    atomic_number = periodictable.atomic_number
+    newoccupations = [occupation if type(occupation) is int else atomic_number(occupation) for occupation in occupations]
 
     struct = Structure.create(uc_basis=frac_cell, uc_volume=volume, uc_scale=scale, uc_reduced_coords=frac_coords, uc_counts=counts, assignments=newoccupations, tags={'comment': comment}, periodicity=0)
 
@@ -269,32 +308,29 @@ def write_poscar(fio, cell, coords, coords_reduced, counts, occupations, comment
       scale: (optional) *string* representing the overall scale of the cell
       vol: *string* representing the volume of the cell (only one of scale and vol can be set)
     """
-    fio = IoAdapterFileWriter.use(fio)
-    f = fio.file
-    f.write(str(comment)+"\n")
+    # The output is assembled in a list and written in one go, rather than with one write per line and field
+    lines = [str(comment)+"\n"]
     if vol is not None:
-        f.write("-"+str(vol)+"\n")
+        lines.append("-"+str(vol)+"\n")
     else:
-        f.write(str(scale)+"\n")
-    for c1, c2, c3 in cell:
-        f.write(str(c1)+" "+str(c2)+" "+str(c3)+"\n")
+        lines.append(str(scale)+"\n")
+    lines.extend(["%s %s %s\n" % (c1, c2, c3) for c1, c2, c3 in cell])
 
-    for i in range(len(counts)):
-        if occupations is None:
-            f.write(periodictable.symbols[i] + " ")
-        else:
-            f.write(str(occupations[i]) + " ")
-    f.write("\n")
+    if occupations is None:
+        lines.append("".join([periodictable.symbols[i] + " " for i in range(len(counts))])+"\n")
+    else:
+        lines.append("".join([str(occupations[i]) + " " for i in range(len(counts))])+"\n")
 
-    for count in counts:
-        f.write(str(count) + " ")
-    f.write("\n")
+    lines.append("".join([str(count) + " " for count in counts])+"\n")
     if coords_reduced:
-        f.write("D\n")
+        lines.append("D\n")
     else:
-        f.write("K\n")
-    for c1, c2, c3 in coords:
-        f.write(str(c1)+" "+str(c2)+" "+str(c3)+"\n")
+        lines.append("K\n")
+    lines.extend(["%s %s %s\n" % (c1, c2, c3) for c1, c2, c3 in coords])
+
+    fio = IoAdapterFileWriter.use(fio)
+    fio.file.write("".join(lines))
+    fio.close()
 
 
 def structure_to_comment(struct):
@@ -339,20 +375,28 @@ def calculate_kpoints(struct, dens=20):
     #local KPTSLINE=$(awk -v "LVAL=$LVAL" -v"equalkpts=$EQUAL_KPTS" -v"bumpkpts=$BUMP_KPTS" '
     basis = struct.uc_basis
 
-    celldet = basis.det()
-    cellvol = abs(celldet)
+    # The reciprocal vectors are v2 x v3, v1 x v3 and v1 x v2 over det(basis). Their squared lengths are computed
+    # exactly on the integer nominators of the basis, which gives the same result as going via
+    # basis.reciprocal().simplify() without building the reciprocal cell and one FracVector per row.
+    v1, v2, v3 = basis.noms
+    detnom = v1[0]*(v2[1]*v3[2] - v2[2]*v3[1]) - v1[1]*(v2[0]*v3[2] - v2[2]*v3[0]) + v1[2]*(v2[0]*v3[1] - v2[1]*v3[0])
 
-    if cellvol == 0:
+    if detnom == 0:
         raise Exception("vasp_if.calculate_kpoints: Error in VASP_KPOINTSLINE: singular cell vectors. POSCAR is broken.")
 
-    recip = basis.reciprocal().simplify()
+    denomsqr = basis.denom**2
+    detnomsqr = detnom**2
     half = 0.5
-    N1 = int(math.ceil(math.sqrt(recip[0].lengthsqr())*dens+half)+0.1)
-    N2 = int(math.ceil(math.sqrt(recip[1].lengthsqr())*dens+half)+0.1)
-    N3 = int(math.ceil(math.sqrt(recip[2].lengthsqr())*dens+half)+0.1)
+    N1 = int(math.ceil(math.sqrt(fractions.Fraction(_cross_lengthsqr(v2, v3)*denomsqr, detnomsqr))*dens+half)+0.1)
+    N2 = int(math.ceil(math.sqrt(fractions.Fraction(_cross_lengthsqr(v1, v3)*denomsqr, detnomsqr))*dens+half)+0.1)
+    N3 = int(math.ceil(math.sqrt(fractions.Fraction(_cross_lengthsqr(v1, v2)*denomsqr, detnomsqr))*dens+half)+0.1)
     return max(1, N1), max(1, N2), max(1, N3)
 
 
+def _cross_lengthsqr(a, b):
+    return (a[1]*b[2] - a[2]*b[1])**2 + (a[2]*b[0] - a[0]*b[2])**2 + (a[0]*b[1] - a[1]*b[0])**2
+
+
 def prepare_single_run(dirpath, struct, poscarspath=None, template='t:/vasp/single/static', overwrite=False):
     if overwrite:
         mkdir_p(dirpath)
@@ -362,8 +406,7 @@ def prepare_single_run(dirpath, struct, poscarspath=None, template='t:/vasp/sing
     #write_generic_kpoints_file(os.path.join(dirpath,"KPOINTS"),comment=structure_to_comment(struct))
     kpoints = calculate_kpoints(struct)
     write_kpoints_file(os.path.join(dirpath, "KPOINTS"), kpoints, comment=structure_to_comment(struct))
-    ioa = IoAdapterFileWriter.use(os.path.join(dirpath, "POTCAR"))
-    f = ioa.file
+    pps = []
     spieces_counts = []
     magmomlist = get_magnetizations(struct.symbols, 5, 1)
     magmom_per_ion = magmomlist[0]
@@ -371,26 +414,22 @@ def prepare_single_run(dirpath, struct, poscarspath=None, template='t:/vasp/sing
     nelect = 0
     natoms = 0
     nmag = 0
-    for i in range(len(struct.assignments)):
-        assignment = struct.assignments[i]
-        count = struct.uc_counts[i]
-        symbol = periodictable.atomic_symbol(assignment.symbol)
+    # struct.uc_counts goes through the unit cell representation on every access, so walk it once alongside the assignments
+    for assignment, count, magmom in zip(struct.assignments, struct.uc_counts, magmom_per_ion):
+        symbol = assignment.symbol
+        if type(symbol) is not str or symbol not in _atomic_symbols:
+            symbol = periodictable.atomic_symbol(symbol)
         pp = get_pseudopotential(symbol, poscarspath)
-        f.write(pp)
+        pps.append(pp)
         spieces_counts.append(count)
         #magmoms.append(str(count)+"*"+str(get_magmom(symbol)))
-        magmom = magmom_per_ion[i]
         magmoms.append(str(count)+"*"+str(magmom))
-
-        def zval(results, match):
-            results['zval'] = float(match.group(1))
-        results = micro_pyawk(IoAdapterString(pp), [["^ *POMASS.*; *ZVAL *= *([^ ]+)", None, zval]])
-        if not 'zval' in results:
-            raise Exception("vasp_if.prepare_simple_static_run: Could not read ZVAL from potcar file")
-        nelect += results['zval']*count
+        nelect += get_potcar_zval(pp)*count
         natoms += count
         nmag += count*magmom
 
+    ioa = IoAdapterFileWriter.use(os.path.join(dirpath, "POTCAR"))
+    ioa.file.write("".join(pps))
     ioa.close()
     nbands1 = int(0.6*nelect + 1.0)+int(math.ceil(natoms/2.0)+0.1)
     nbands2 = int(0.6*nelect + 1.0)+int(math.ceil(nmag/2.0)+0.1)
@@ -414,6 +453,36 @@ def prepare_single_run(dirpath, struct, poscarspath=None, template='t:/vasp/sing
     apply_templates(template, dirpath, envglobals=data, mkdir=False)
 
 
+# All OUTCAR lines OutcarReader reacts to, as one alternation so that each line is only scanned once
+_outcar_line_re = re.compile(r"(?P<energy>^ *energy *without *entropy= *(?P<energy_with_entropy>[^ ]+) *energy\(sigma->0\) *= *(?P<energy_sigma0>[^ ]+) *$)"
+                             r"|(?P<final>FREE ENERGIE)")
+
+# How much of the end of an uncompressed OUTCAR to look at before falling back to reading all of it
+_outcar_tail_bytes = 65536
+
+
+def _read_text_tail(f, nbytes):
+    """
+    Returns a text stream over the whole lines in the last nbytes of f, or None if f is not an uncompressed
+    file that is positioned at its start (or is short enough to just be read through). f is left at its start.
+    """
+    raw = getattr(f, 'buffer', None)
+    if not isinstance(raw, io.BufferedReader) or not raw.seekable() or raw.tell() != 0:
+        return None
+    size = raw.seek(0, io.SEEK_END)
+    if size <= nbytes:
+        f.seek(0)
+        return None
+    raw.seek(size - nbytes)
+    data = raw.read()
+    f.seek(0)
+    # Drop the partial line the tail starts in
+    newline = data.find(b'\n')
+    if newline < 0:
+        return None
+    return io.TextIOWrapper(io.BytesIO(data[newline+1:]), encoding=f.encoding)
+
+
 class OutcarReader():
 
     def __init__(self, ioa):
@@ -422,20 +491,37 @@ class OutcarReader():
         pass
 
     def parse(self):
-        results = {'final': False}
-
-        def set_final(results, match):
-            results['final'] = True
-
-        def read_energy(results, match):
-            self.final_energy_with_entropy = match.group(1)
-            self.final_energy = match.group(2)
-        results = micro_pyawk(self.ioa, [
-                              ["^ *energy *without *entropy= *([^ ]+) *energy\(sigma->0\) *= *([^ ]+) *$", None, read_energy],
-                              ["FREE ENERGIE", None, set_final],
-                              ], results, debug=False)
+        ioa = IoAdapterFileReader.use(self.ioa)
+        # The final energy is printed at the end of the OUTCAR, so for uncompressed files the tail is searched first.
+        # Only if it has both the last energy line and the FREE ENERGIE marker is the result the same as for a
+        # full scan; otherwise, and for compressed streams that cannot seek cheaply, the whole file is read.
+        tail = _read_text_tail(ioa.file, _outcar_tail_bytes)
+        energy, final = (None, False) if tail is None else self._scan(tail)
+        if energy is None or not final:
+            energy, final = self._scan(ioa.file)
+        # A reader passed in by the caller is left open for the caller to close
+        if ioa is not self.ioa:
+            ioa.close()
+        if energy is not None:
+            self.final_energy_with_entropy = energy.group('energy_with_entropy')
+            self.final_energy = energy.group('energy_sigma0')
+        self.final = final
         self.parsed = True
 
+    @staticmethod
+    def _scan(lines):
+        energy = None
+        final = False
+        for line in lines:
+            match = _outcar_line_re.search(line)
+            if match is None:
+                continue
+            if match.lastgroup == 'energy':
+                energy = match
+            else:
+                final = True
+        return energy, final
+
 
 def read_outcar(ioa):
     return OutcarReader(ioa)
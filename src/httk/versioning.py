@@ -16,47 +16,25 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-_default_copyright_end_year = "2018"
+"""
+Version information for httk.
 
-import sys, os, subprocess, datetime
-import codecs
+The version data is determined by httk.config (see the docstring of httk/config/config.py), which
+only runs git on first access to httk_version, httk_version_date or httk_copyright_note (on Python 3.7 and later).
+"""
+
+import sys, os
 from httk.config import httk_root, config
+from httk.config.config import determine_version_data
 
 sourcedir = os.path.dirname(os.path.realpath(__file__))
 
-try:
-    from httk.distdata import version, version_date, copyright_note
-    httk_version = version
-    httk_version_date = version_date
-    httk_copyright_note = copyright_note
-
-except ImportError:
-    httk_version = None
-    if (not config.getboolean('general', 'bypass_git_version_lookup')) and os.path.exists(os.path.join(httk_root,'.git')):
-        try:
-            httk_version = subprocess.check_output(["git", "describe","--dirty","--always"],cwd=sourcedir).strip()
-            httk_version = codecs.decode(httk_version, 'utf-8')
-            if httk_version.endswith('-dirty'):
-                _git_commit_datetime = datetime.datetime.now()
-            else:
-                _git_commit_datetime = datetime.datetime.fromtimestamp(int(subprocess.check_output(["git", "log","-1",'--format=%ct'],cwd=sourcedir)))
-            httk_version_date = "%d-%02d-%02d" % (_git_commit_datetime.year,_git_commit_datetime.month, _git_commit_datetime.day)
-            httk_copyright_note = "(c) 2012 - " + str(_git_commit_datetime.year)
-
-            # PEP 440 compliance
-            httk_version = httk_version[1:]
-            httk_version = httk_version.replace('-','.dev',1)
-            httk_version = httk_version.replace('-','+',1)
-            if httk_version.endswith('-dirty'):
-                httk_version = httk_version.replace('-dirty','.d')
-
-        except Exception as e:
-            sys.stderr.write("Note: failed to obtain httk version from git: " + str(e) + "\n")
-            httk_version = 'unknown'
-            httk_version_date = 'unknown'
-            httk_copyright_note = "(c) 2012 - " + _default_copyright_end_year
-
-    else:
-        httk_version = 'unknown'
-        httk_version_date = 'unknown'
-        httk_copyright_note = "(c) 2012 - " + _default_copyright_end_year
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in ('httk_version', 'httk_version_date', 'httk_copyright_note'):
+            version_data = determine_version_data()
+            globals().update(version_data)
+            return version_data[name]
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+else:
+    globals().update(determine_version_data())